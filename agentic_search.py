@@ -1,39 +1,27 @@
-import os
-from dotenv import load_dotenv
-from azure.search.documents.indexes.models import SearchIndex, SearchField, VectorSearch, VectorSearchProfile, HnswAlgorithmConfiguration, AzureOpenAIVectorizer, AzureOpenAIVectorizerParameters, SemanticSearch, SemanticConfiguration, SemanticPrioritizedFields, SemanticField
-from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents import SearchIndexingBufferedSender
-import requests
-from azure.search.documents.indexes.models import KnowledgeAgent, KnowledgeAgentAzureOpenAIModel, KnowledgeAgentTargetIndex, KnowledgeAgentRequestLimits, AzureOpenAIVectorizerParameters
-from azure.search.documents.agent import KnowledgeAgentRetrievalClient
-from azure.search.documents.agent.models import KnowledgeAgentRetrievalRequest, KnowledgeAgentMessage, KnowledgeAgentMessageTextContent, KnowledgeAgentIndexParams
 import textwrap
 import json
-from openai import AzureOpenAI
-from azure.core.credentials import AzureKeyCredential
+# Azure Search, OpenAI and requests are imported inside the functions that use them to keep startup fast
+from config import get_settings, get_search_credential, get_search_index_client, get_knowledge_agent_client, get_openai_client
 
 
-# load environment variables
-load_dotenv()
+# load environment variables (shared, lazily initialized configuration)
+settings = get_settings()
 
 # initialize variables
-endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
-search_key = os.getenv("AZURE_SEARCH_KEY")
-azure_openai_api_key = os.getenv("AZURE_OPENAI_API_KEY")
-search_credential = AzureKeyCredential(search_key)
-azure_openai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-azure_openai_gpt_deployment = os.getenv("AZURE_OPENAI_GPT_DEPLOYMENT")
-azure_openai_gpt_model = os.getenv("AZURE_OPENAI_GPT_MODEL")
-azure_openai_api_version = os.getenv("AZURE_OPENAI_API_VERSION")
-azure_openai_embedding_deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
-azure_openai_embedding_model = os.getenv("AZURE_OPENAI_EMBEDDING_MODEL")
-index_name = os.getenv("INDEX_NAME")
-agent_name = os.getenv("AGENT_NAME")
-answer_model = os.getenv("ANSWER_MODEL")
-api_version = os.getenv("API_VERSION")
+endpoint = settings.search_endpoint
+azure_openai_endpoint = settings.azure_openai_endpoint
+azure_openai_gpt_deployment = settings.azure_openai_gpt_deployment
+azure_openai_gpt_model = settings.azure_openai_gpt_model
+azure_openai_embedding_deployment = settings.azure_openai_embedding_deployment
+azure_openai_embedding_model = settings.azure_openai_embedding_model
+index_name = settings.index_name
+agent_name = settings.agent_name
+answer_model = settings.answer_model
 
 # create ai search index
 def create_index(index_name):
+    from azure.search.documents.indexes.models import SearchIndex, SearchField, VectorSearch, VectorSearchProfile, HnswAlgorithmConfiguration, AzureOpenAIVectorizer, AzureOpenAIVectorizerParameters, SemanticSearch, SemanticConfiguration, SemanticPrioritizedFields, SemanticField
+
     index = SearchIndex(
         name=index_name,
         fields=[
@@ -71,22 +59,27 @@ def create_index(index_name):
         )
     )
 
-    index_client = SearchIndexClient(endpoint=endpoint, credential=search_credential)
+    index_client = get_search_index_client()
     index_client.create_or_update_index(index)
     print(f"Index '{index_name}' created or updated successfully")
     return index_client
 
 def load_data(index_name):
+    import requests
+    from azure.search.documents import SearchIndexingBufferedSender
+
     url = "https://raw.githubusercontent.com/Azure-Samples/azure-search-sample-data/refs/heads/main/nasa-e-book/earth-at-night-json/documents.json"
     documents = requests.get(url).json()
 
-    with SearchIndexingBufferedSender(endpoint=endpoint, index_name=index_name, credential=search_credential) as client:
+    with SearchIndexingBufferedSender(endpoint=endpoint, index_name=index_name, credential=get_search_credential()) as client:
         client.upload_documents(documents=documents)
 
     print(f"Documents uploaded to index '{index_name}'")
 
 # create knowledge agent
 def create_knowledge_agent(index_client, agent_name):
+    from azure.search.documents.indexes.models import KnowledgeAgent, KnowledgeAgentAzureOpenAIModel, KnowledgeAgentTargetIndex, AzureOpenAIVectorizerParameters
+
     knowledge_agent = KnowledgeAgent(
         name=agent_name,
         models=[
@@ -112,7 +105,7 @@ def create_knowledge_agent(index_client, agent_name):
 
 # create knowledge agent client
 def create_knowledge_agent_client(knowledge_agent, index_name, agent_name):
-    knowledge_agent_client = KnowledgeAgentRetrievalClient(endpoint=endpoint, credential=search_credential, index_name=index_name, agent_name=agent_name)
+    knowledge_agent_client = get_knowledge_agent_client(index_name, agent_name)
     return knowledge_agent_client
 
 # create knowledge agent instructions
@@ -132,6 +125,8 @@ def create_messages_for_knowledge_agent(agent_name):
 
 # accept user query and process it using the retrieval pipeline
 def init_retrieval_pipeline(knowledge_agent_client, messages, index_name):
+    from azure.search.documents.agent.models import KnowledgeAgentRetrievalRequest, KnowledgeAgentMessage, KnowledgeAgentMessageTextContent, KnowledgeAgentIndexParams
+
     messages.append({
         "role": "user",
         "content": """
@@ -167,11 +162,7 @@ def init_retrieval_pipeline(knowledge_agent_client, messages, index_name):
 # create open ai client to get response from the model
 def create_openai_client():
     
-    client = AzureOpenAI(
-        azure_endpoint = azure_openai_endpoint,
-        api_version = azure_openai_api_version,
-        api_key = azure_openai_api_key
-    )
+    client = get_openai_client()
 
     return client
 
@@ -1,65 +1,171 @@
-import os
-from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any
-
-from azure.search.documents.indexes.models import SearchIndex, SearchField, VectorSearch, VectorSearchProfile, HnswAlgorithmConfiguration, AzureOpenAIVectorizer, AzureOpenAIVectorizerParameters, SemanticSearch, SemanticConfiguration, SemanticPrioritizedFields, SemanticField
-from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents import SearchIndexingBufferedSender
-import requests
-from azure.search.documents.indexes.models import KnowledgeAgent, KnowledgeAgentAzureOpenAIModel, KnowledgeAgentTargetIndex, KnowledgeAgentRequestLimits, AzureOpenAIVectorizerParameters
-from azure.search.documents.agent import KnowledgeAgentRetrievalClient
-from azure.search.documents.agent.models import KnowledgeAgentRetrievalRequest, KnowledgeAgentMessage, KnowledgeAgentMessageTextContent, KnowledgeAgentIndexParams
-import textwrap
+import time
+import uuid
 import json
-from openai import AzureOpenAI
-from azure.core.credentials import AzureKeyCredential
-
-# load environment variables
-load_dotenv()
+import hmac
+import hashlib
+from contextlib import contextmanager, asynccontextmanager, nullcontext
+from fastapi import FastAPI, HTTPException, Header, Query
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, FileResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import List, Dict, Any, Optional
+
+# Azure Search, OpenAI and requests are imported inside the functions that use them to keep startup fast
+from concurrent.futures import ThreadPoolExecutor
+from config import get_settings, get_search_credential, get_search_index_client, get_knowledge_agent_client, get_openai_client
+from domain_indexes import parse_domains, parse_reranker_thresholds, get_target_indexes, merge_retrieval_results
+from compaction import RESPONSE_FIELDS, compact_retrieval_response, select_references, parse_fields
+from profiling import Profiler
+from state_backend import create_state_backend
+from resilience import Metrics, AdmissionController, CircuitBreaker, Overloaded, CircuitOpenError, Deadline, DeadlineExceeded, Hedger
+
+# orjson is optional, fall back to the standard JSON encoder when it is not installed
+try:
+    import orjson  # noqa: F401
+    default_response_class = ORJSONResponse
+except ImportError:
+    default_response_class = JSONResponse
+
+# load environment variables (shared, lazily initialized configuration)
+settings = get_settings()
 
 # initialize variables
-endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
-search_key = os.getenv("AZURE_SEARCH_KEY")
-azure_openai_api_key = os.getenv("AZURE_OPENAI_API_KEY")
-search_credential = AzureKeyCredential(search_key)
-azure_openai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-azure_openai_gpt_deployment = os.getenv("AZURE_OPENAI_GPT_DEPLOYMENT")
-azure_openai_gpt_model = os.getenv("AZURE_OPENAI_GPT_MODEL")
-azure_openai_api_version = os.getenv("AZURE_OPENAI_API_VERSION")
-azure_openai_embedding_deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
-azure_openai_embedding_model = os.getenv("AZURE_OPENAI_EMBEDDING_MODEL")
-index_name = os.getenv("INDEX_NAME")
-agent_name = os.getenv("AGENT_NAME")
-answer_model = os.getenv("ANSWER_MODEL")
-api_version = os.getenv("API_VERSION")
-max_conversation_history = int(os.getenv("MAX_CONVERSATION_HISTORY", "1"))
+endpoint = settings.search_endpoint
+azure_openai_endpoint = settings.azure_openai_endpoint
+azure_openai_gpt_deployment = settings.azure_openai_gpt_deployment
+azure_openai_gpt_model = settings.azure_openai_gpt_model
+azure_openai_embedding_deployment = settings.azure_openai_embedding_deployment
+azure_openai_embedding_model = settings.azure_openai_embedding_model
+index_name = settings.index_name
+agent_name = settings.agent_name
+answer_model = settings.answer_model
+max_conversation_history = settings.max_conversation_history
+# optional per-domain indexes (e.g. "claims,policies,customers,providers"), queried concurrently
+domains = parse_domains(settings.domain_indexes)
+reranker_thresholds = parse_reranker_thresholds(settings.domain_reranker_thresholds)
+# retrieval payload compaction (0 = unlimited)
+retrieval_token_budget = settings.retrieval_token_budget
+max_references = settings.max_references
+default_response_fields = parse_fields(settings.default_response_fields)
+# gzip responses larger than this many bytes for clients that accept it (0 = disabled)
+gzip_minimum_size = settings.gzip_minimum_size
+# opt-in profiling of sampled requests
+profiler = Profiler.from_settings(settings)
+# optional key required by the /admin endpoints
+admin_api_key = settings.admin_api_key
+# shared state for conversations and provisioning flags: memory:// (single worker), sqlite:///state.db or redis://host:6379/0
+state = create_state_backend(settings.state_backend_url)
+conversation_ttl = settings.conversation_ttl_seconds
+provisioning_timeout = settings.provisioning_timeout_seconds
+conversation_lock_timeout = settings.conversation_lock_timeout_seconds
+
+# state backend namespaces
+CONVERSATIONS = "conversations"
+FLAGS = "flags"
+LOCKS = "locks"
+
+# admission control and per-upstream circuit breakers
+metrics = Metrics()
+admission_controller = AdmissionController(
+    max_concurrency=settings.max_concurrent_requests,
+    max_queue=settings.max_queued_requests,
+    queue_timeout=settings.queue_timeout_seconds,
+    metrics=metrics
+)
+circuit_breaker_settings = {
+    "failure_threshold": settings.circuit_failure_threshold,
+    "reset_timeout": settings.circuit_reset_timeout_seconds,
+    "half_open_max_calls": settings.circuit_half_open_max_calls,
+    "metrics": metrics
+}
+# one breaker per target index, so an unhealthy domain index doesn't cut off the others
+retrieval_index_names = [target_index_name for target_index_name, _ in get_target_indexes(index_name, domains, reranker_thresholds)]
+retrieve_breakers = {name: CircuitBreaker(f"knowledge_agent_retrieve:{name}", **circuit_breaker_settings) for name in retrieval_index_names}
+responses_breaker = CircuitBreaker("openai_responses_create", **circuit_breaker_settings)
+
+# end-to-end request deadline (0 = none) and optional hedging of idempotent upstream calls
+request_deadline_seconds = settings.request_deadline_seconds
+hedge_settings = {
+    "percentile": settings.hedge_percentile,
+    "budget_ratio": settings.hedge_budget_ratio,
+    "min_delay": settings.hedge_min_delay_seconds,
+    "metrics": metrics
+}
+# one hedger per target index (each has its own latency distribution and breaker). azure-core's `timeout` caps retries
+# and connecting, `read_timeout` the response read, both get the remaining deadline. Every admitted request
+# runs one primary per index plus at most one hedge, size the pools so calls never queue locally
+# (a local queue would look like upstream latency and trigger hedges)
+retrieve_hedgers = {
+    name: Hedger(f"knowledge_agent_retrieve:{name}", enabled=settings.hedge_retrieve, max_workers=2 * settings.max_concurrent_requests, breaker=retrieve_breakers[name], bind=profiler.bind, timeout_kwargs=("timeout", "read_timeout"), **hedge_settings)
+    for name in retrieval_index_names
+}
+# responses.create stores the response and bills every call, so it is never hedged (deadline and breaker only)
+responses_hedger = Hedger("openai_responses_create", enabled=False, max_workers=2 * settings.max_concurrent_requests, breaker=responses_breaker, bind=profiler.bind, metrics=metrics)
+
+# threads kept free for the sync endpoints on top of the admitted retrieval requests
+THREADPOOL_HEADROOM = 8
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Admitted retrieval requests and the sync endpoints share anyio's threadpool (40 threads by default),
+    # make sure every admitted request gets a thread and the other endpoints still have room
+    import anyio.to_thread
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    required_threads = admission_controller.max_concurrency + THREADPOOL_HEADROOM
+    if limiter.total_tokens < required_threads:
+        limiter.total_tokens = required_threads
+    yield
 
 # Create FastAPI app
-app = FastAPI(title="Agentic Search API", version="1.0.0")
+app = FastAPI(title="Agentic Search API", version="1.0.0", default_response_class=default_response_class, lifespan=lifespan)
+if gzip_minimum_size > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=gzip_minimum_size)
 
 # Pydantic models
 class AgenticRetrievalRequest(BaseModel):
     query: str
+    # conversations are kept per id in the shared state backend, a new one is started when unset
+    conversation_id: Optional[str] = None
+    # fields to return, defaults to DEFAULT_RESPONSE_FIELDS (all fields when unset)
+    fields: Optional[List[str]] = None
 
 class AgenticRetrievalResponse(BaseModel):
-    response_string: str
-    messages: List[Dict[str, Any]]
-    activity: List[Dict[str, Any]]
-    references: List[Dict[str, Any]]
+    # always returned so the client can send follow-up questions in the same conversation
+    conversation_id: Optional[str] = None
+    response_string: Optional[str] = None
+    messages: Optional[List[Dict[str, Any]]] = None
+    activity: Optional[List[Dict[str, Any]]] = None
+    references: Optional[List[Dict[str, Any]]] = None
 
-# Global variables to store knowledge agent (configuration) and conversation context
-knowledge_agent = None
-messages = []
+# Knowledge agent provisioning flags and conversation context live in the state backend so all workers share them
 
 # Health check endpoint
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "healthy"}
 
+# Admission control, shed and rejected request counters and circuit breaker states
+@app.get("/metrics")
+async def metrics_endpoint():
+    return {
+        "counters": metrics.snapshot(),
+        "admission": admission_controller.state(),
+        "circuit_breakers": {breaker.name: breaker.state() for breaker in [*retrieve_breakers.values(), responses_breaker]},
+        "hedging": {hedger.name: {"enabled": hedger.enabled, "delay": hedger.hedge_delay()} for hedger in [*retrieve_hedgers.values(), responses_hedger]}
+    }
+
+def check_admin_key(x_admin_key: Optional[str]):
+    # /admin routes are disabled unless ADMIN_API_KEY is configured
+    if not admin_api_key:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_admin_key or "").encode("utf-8"), admin_api_key.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Key header")
+
 # Create AI Search index
 def create_index(index_name: str):
+    from azure.search.documents.indexes.models import SearchIndex, SearchField, VectorSearch, VectorSearchProfile, HnswAlgorithmConfiguration, AzureOpenAIVectorizer, AzureOpenAIVectorizerParameters, SemanticSearch, SemanticConfiguration, SemanticPrioritizedFields, SemanticField
+
     index = SearchIndex(
         name=index_name,
         fields=[
@@ -98,18 +204,23 @@ def create_index(index_name: str):
     )
 
     global index_client
-    index_client = SearchIndexClient(endpoint=endpoint, credential=search_credential)
+    index_client = get_search_index_client()
     index_client.create_or_update_index(index)
     return index_client
 
 def load_data(index_name: str):
+    import requests
+    from azure.search.documents import SearchIndexingBufferedSender
+
     url = "https://raw.githubusercontent.com/Azure-Samples/azure-search-sample-data/refs/heads/main/nasa-e-book/earth-at-night-json/documents.json"
     documents = requests.get(url).json()
 
-    with SearchIndexingBufferedSender(endpoint=endpoint, index_name=index_name, credential=search_credential) as client:
+    with SearchIndexingBufferedSender(endpoint=endpoint, index_name=index_name, credential=get_search_credential()) as client:
         client.upload_documents(documents=documents)
 
-def create_knowledge_agent(index_client, agent_name: str, index_name: str):
+def create_knowledge_agent(index_client, agent_name: str, index_name: str, timeout: Optional[float] = None):
+    from azure.search.documents.indexes.models import KnowledgeAgent, KnowledgeAgentAzureOpenAIModel, KnowledgeAgentTargetIndex, AzureOpenAIVectorizerParameters
+
     knowledge_agent = KnowledgeAgent(
         name=agent_name,
         models=[
@@ -123,18 +234,21 @@ def create_knowledge_agent(index_client, agent_name: str, index_name: str):
         ],
         target_indexes=[
             KnowledgeAgentTargetIndex(
-                index_name=index_name,
+                index_name=target_index_name,
                 default_reranker_threshold=2.5
             )
+            for target_index_name, _ in get_target_indexes(index_name, domains, reranker_thresholds)
         ],
     )
 
-    index_client.create_or_update_agent(knowledge_agent)
+    # timeout caps retries and connecting, read_timeout the response read
+    timeout_kwargs = {"timeout": timeout, "read_timeout": timeout} if timeout is not None else {}
+    index_client.create_or_update_agent(knowledge_agent, **timeout_kwargs)
     return knowledge_agent
 
 def create_knowledge_agent_client(index_name: str, agent_name: str):
-    knowledge_agent_client = KnowledgeAgentRetrievalClient(endpoint=endpoint, credential=search_credential, index_name=index_name, agent_name=agent_name)
-    return knowledge_agent_client
+    # clients are created once per process and reused across requests
+    return get_knowledge_agent_client(index_name, agent_name)
 
 def create_messages_for_knowledge_agent():
     instructions = """You are an expert Insurance Assistant that helps customers with their insurance claims, policy information, and coverage details.
@@ -195,8 +309,88 @@ def manage_conversation_history(messages_list):
     # Reconstruct messages list
     return [instructions] + conversation_pairs
 
-def init_retrieval_pipeline(knowledge_agent_client, user_question: str, index_name: str):
-    global messages
+def retrieve_from_index(knowledge_agent_client, agent_messages, target_index_name: str, reranker_threshold: float, deadline: Optional[Deadline] = None):
+    from azure.search.documents.agent.models import KnowledgeAgentRetrievalRequest, KnowledgeAgentIndexParams
+
+    # retrieval is read-only, so it is safe to hedge
+    retrieval_result = retrieve_hedgers[target_index_name].call(
+        knowledge_agent_client.retrieve,
+        deadline=deadline,
+        retrieval_request=KnowledgeAgentRetrievalRequest(
+            messages=agent_messages,
+            target_index_params=[KnowledgeAgentIndexParams(index_name=target_index_name, reranker_threshold=reranker_threshold)]
+        )
+    )
+    return (
+        target_index_name,
+        reranker_threshold,
+        retrieval_result.response[0].content[0].text,
+        [a.as_dict() for a in retrieval_result.activity],
+        [r.as_dict() for r in retrieval_result.references]
+    )
+
+def get_knowledge_agent_fingerprint():
+    """Hash of the settings that define the knowledge agent, so config changes are re-provisioned"""
+    definition = {
+        "agent_name": agent_name,
+        "resource_url": azure_openai_endpoint,
+        "deployment_name": azure_openai_gpt_deployment,
+        "model_name": azure_openai_gpt_model,
+        "target_indexes": [target_index_name for target_index_name, _ in get_target_indexes(index_name, domains, reranker_thresholds)]
+    }
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def ensure_knowledge_agent(deadline: Optional[Deadline] = None):
+    """Provision the knowledge agent once across every worker sharing the state backend, within the request deadline"""
+    # the flag holds the fingerprint of the provisioned definition, a changed config provisions again
+    provisioned_key = f"knowledge_agent:{agent_name}"
+    fingerprint = get_knowledge_agent_fingerprint()
+    provisioning_key = f"knowledge_agent_provisioning:{agent_name}:{fingerprint}"
+    provisioning_deadline = Deadline(provisioning_timeout)
+
+    while state.get(FLAGS, provisioned_key) != fingerprint:
+        if deadline is not None:
+            deadline.check("knowledge agent provisioning")
+        # Only the worker holding the provisioning lock creates the agent, the others wait for the flag
+        if state.set_if_absent(FLAGS, provisioning_key, True, ttl=provisioning_timeout):
+            try:
+                remaining = deadline.remaining() if deadline is not None else None
+                create_knowledge_agent(get_search_index_client(), agent_name, index_name, timeout=remaining)
+                state.set(FLAGS, provisioned_key, fingerprint)
+            except Exception as e:
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded("Request deadline exceeded during knowledge agent provisioning") from e
+                raise
+            finally:
+                state.delete(FLAGS, provisioning_key)
+            return
+        if provisioning_deadline.expired():
+            raise TimeoutError(f"Timed out waiting for knowledge agent '{agent_name}' to be provisioned")
+        remaining = deadline.remaining() if deadline is not None else None
+        time.sleep(0.2 if remaining is None else min(0.2, remaining))
+
+@contextmanager
+def conversation_lock(conversation_id: str, deadline: Optional[Deadline] = None):
+    """Serialize the read-modify-write of a conversation across every worker sharing the state backend"""
+    # the token makes sure a worker only releases its own lock, not one taken over after its TTL expired
+    token = uuid.uuid4().hex
+    while not state.set_if_absent(LOCKS, conversation_id, token, ttl=conversation_lock_timeout):
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            metrics.increment("conversation_lock_timeout")
+            raise DeadlineExceeded(f"Request deadline exceeded waiting for conversation '{conversation_id}'")
+        time.sleep(0.05 if remaining is None else min(0.05, remaining))
+    try:
+        yield
+    finally:
+        state.delete_if_equal(LOCKS, conversation_id, token)
+
+def reset_knowledge_agent_state():
+    state.delete(FLAGS, f"knowledge_agent:{agent_name}")
+    state.clear(CONVERSATIONS)
+
+def init_retrieval_pipeline(knowledge_agent_client, user_question: str, index_name: str, messages: List[Dict[str, Any]], deadline: Optional[Deadline] = None):
+    from azure.search.documents.agent.models import KnowledgeAgentMessage, KnowledgeAgentMessageTextContent
     
     # Add user question to existing conversation context
     messages.append({
@@ -204,17 +398,37 @@ def init_retrieval_pipeline(knowledge_agent_client, user_question: str, index_na
         "content": user_question
     })
     
-    retrieval_result = knowledge_agent_client.retrieve(
-        retrieval_request=KnowledgeAgentRetrievalRequest(
-            messages=[KnowledgeAgentMessage(role=msg["role"], content=[KnowledgeAgentMessageTextContent(text=msg["content"])]) for msg in messages if msg["role"] != "system"],
-            target_index_params=[KnowledgeAgentIndexParams(index_name=index_name, reranker_threshold=2.0)]
-        )
-    )
+    agent_messages = [KnowledgeAgentMessage(role=msg["role"], content=[KnowledgeAgentMessageTextContent(text=msg["content"])]) for msg in messages if msg["role"] != "system"]
+    target_indexes = get_target_indexes(index_name, domains, reranker_thresholds)
+
+    if len(target_indexes) == 1:
+        _, _, response_text, activity, references = retrieve_from_index(knowledge_agent_client, agent_messages, *target_indexes[0], deadline)
+        retrieval_data = {"response": response_text, "activity": activity, "references": references}
+    else:
+        # Fan out to every domain index concurrently and merge on normalized reranker scores
+        with ThreadPoolExecutor(max_workers=len(target_indexes)) as executor:
+            # bound so a profiled request also captures the work done in the executor threads
+            futures = [executor.submit(profiler.bind(retrieve_from_index), knowledge_agent_client, agent_messages, *target, deadline) for target in target_indexes]
+        # a domain index whose circuit is open is left out, the request only fails when every circuit is open
+        results = []
+        circuit_errors = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except CircuitOpenError as e:
+                metrics.increment(f"domain_skipped_circuit_open:{e.upstream}")
+                circuit_errors.append(e)
+        if not results:
+            raise circuit_errors[0]
+        retrieval_data = merge_retrieval_results(results)
+
+    # Deduplicate overlapping chunks and keep the top-scored ones within the token budget
+    response_text, kept_ref_ids = compact_retrieval_response(retrieval_data["response"], retrieval_data["references"], retrieval_token_budget)
 
     # Add agent's retrieval response to conversation context
     messages.append({
         "role": "assistant",
-        "content": retrieval_result.response[0].content[0].text # this is not LLM generated response, instead these are semantic ranker processed results, re-ranked records by their semantic ranking score.
+        "content": response_text # this is not LLM generated response, instead these are semantic ranker processed results, re-ranked records by their semantic ranking score.
     })
     
     # Manage conversation history based on configuration
@@ -223,21 +437,20 @@ def init_retrieval_pipeline(knowledge_agent_client, user_question: str, index_na
     # Return messages, activity, and references
     return {
         "messages": messages,
-        "response": retrieval_result.response[0].content[0].text,
-        "activity": [a.as_dict() for a in retrieval_result.activity],
-        "references": [r.as_dict() for r in retrieval_result.references]
+        "response": response_text,
+        "activity": retrieval_data["activity"],
+        "references": retrieval_data["references"],
+        "kept_ref_ids": kept_ref_ids
     }
 
 def create_openai_client():
-    client = AzureOpenAI(
-        azure_endpoint = azure_openai_endpoint,
-        api_version = azure_openai_api_version,
-        api_key = azure_openai_api_key
-    )
-    return client
+    # clients are created once per process and reused across requests
+    return get_openai_client()
 
-def generate_response(openai_client, messages):
-    response = openai_client.responses.create(
+def generate_response(openai_client, messages, deadline: Optional[Deadline] = None):
+    response = responses_hedger.call(
+        openai_client.responses.create,
+        deadline=deadline,
         model=answer_model,
         input=messages
     )
@@ -247,14 +460,19 @@ def generate_response(openai_client, messages):
 @app.post("/create-index")
 def create_index_endpoint():
     try:
-        # Use index name from environment variables
-        index_client = create_index(index_name)
-        return {"message": f"Index '{index_name}' created or updated successfully", "status": "success"}
+        # Use index name from environment variables (one index per domain when DOMAIN_INDEXES is set)
+        target_index_names = [target_index_name for target_index_name, _ in get_target_indexes(index_name, domains)]
+        for target_index_name in target_index_names:
+            index_client = create_index(target_index_name)
+        return {"message": f"Index(es) {', '.join(repr(name) for name in target_index_names)} created or updated successfully", "status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating index: {str(e)}")
 
 @app.post("/load-data")
 def load_data_endpoint():
+    # the sample data belongs to no domain, and with DOMAIN_INDEXES the base index is never created or queried
+    if domains:
+        raise HTTPException(status_code=400, detail="Sample data can only be loaded into a single index, DOMAIN_INDEXES is set. Load domain data with utility/load_csv_data.py")
     try:
         # Use index name from environment variables
         load_data(index_name)
@@ -264,57 +482,106 @@ def load_data_endpoint():
 
 
 
-@app.post("/perform-agentic-retrieval", response_model=AgenticRetrievalResponse)
-def perform_agentic_retrieval(request: AgenticRetrievalRequest) -> AgenticRetrievalResponse:
+@app.post("/perform-agentic-retrieval", response_model=AgenticRetrievalResponse, response_model_exclude_none=True)
+async def perform_agentic_retrieval(request: AgenticRetrievalRequest, x_request_id: Optional[str] = Header(None)) -> AgenticRetrievalResponse:
+    fields = request.fields or default_response_fields
+    unknown_fields = [field for field in fields if field not in RESPONSE_FIELDS]
+    if unknown_fields:
+        raise HTTPException(status_code=400, detail=f"Unknown response fields: {', '.join(unknown_fields)}. Allowed: {', '.join(RESPONSE_FIELDS)}")
+
+    # The deadline starts on arrival so time spent queued counts against it
+    deadline = Deadline(request_deadline_seconds)
     try:
-        global knowledge_agent, messages
-        
-        # Lazy initialization - create knowledge agent if it doesn't exist
-        if knowledge_agent is None:
-            # Create fresh index client
-            index_client = SearchIndexClient(endpoint=endpoint, credential=search_credential)
-            # Create and store knowledge agent globally
-            knowledge_agent = create_knowledge_agent(index_client, agent_name, index_name)
-            # Initialize conversation context with agent instructions
-            messages = create_messages_for_knowledge_agent()
+        # Bounded concurrency, fail fast with 429/503 instead of queueing on slow upstreams.
+        # Admission happens on the event loop, only admitted requests take a threadpool thread
+        async with admission_controller.admit(deadline):
+            return await run_in_threadpool(run_profiled_agentic_retrieval, request, fields, deadline, x_request_id or uuid.uuid4().hex)
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def run_profiled_agentic_retrieval(request: AgenticRetrievalRequest, fields: List[str], deadline: Optional[Deadline], request_id: str) -> AgenticRetrievalResponse:
+    # Capture a CPU profile and allocation snapshot when this request is sampled,
+    # in the worker thread since cProfile only sees the thread it is enabled in
+    with profiler.capture("perform-agentic-retrieval", request_id):
+        return run_agentic_retrieval(request, fields, deadline)
+
+def run_agentic_retrieval(request: AgenticRetrievalRequest, fields: List[str], deadline: Optional[Deadline] = None) -> AgenticRetrievalResponse:
+    try:
+        # Lazy initialization - create knowledge agent if no worker has provisioned it yet
+        ensure_knowledge_agent(deadline)
         
         # Use values from environment variables
-        # Create fresh clients for each request
+        # Clients are shared across requests
         knowledge_agent_client = create_knowledge_agent_client(index_name, agent_name)
         openai_client = create_openai_client()
         
-        # Perform retrieval and update conversation context
-        retrieval_data = init_retrieval_pipeline(knowledge_agent_client, request.query, index_name)
-        
-        # Update global messages from retrieval data
-        messages = retrieval_data["messages"]
+        # Concurrent turns of the same conversation take turns so none of them is lost,
+        # a new conversation gets a fresh id that no other request can hold yet
+        conversation_id = request.conversation_id or uuid.uuid4().hex
+        lock = conversation_lock(conversation_id, deadline) if request.conversation_id else nullcontext()
+        with lock:
+            # Load conversation context, starting with agent instructions for new conversations
+            messages = state.get(CONVERSATIONS, conversation_id) or create_messages_for_knowledge_agent()
+            
+            # Perform retrieval and update conversation context
+            retrieval_data = init_retrieval_pipeline(knowledge_agent_client, request.query, index_name, messages, deadline)
+            
+            # Store updated conversation context from retrieval data
+            messages = retrieval_data["messages"]
+            state.set(CONVERSATIONS, conversation_id, messages, ttl=conversation_ttl)
         
         # Generate final response from LLM
-        final_answer = generate_response(openai_client, messages)
+        final_answer = generate_response(openai_client, messages, deadline)
+        
+        # Keep only references cited in the answer (or the top-scored ones sent to the model)
+        references = select_references(retrieval_data["references"], final_answer, retrieval_data["kept_ref_ids"], max_references)
         
-        # Return comprehensive response with all data
+        # Return only the fields the client asked for
         return AgenticRetrievalResponse(
-            response_string=final_answer,
-            messages=messages,
-            activity=retrieval_data["activity"],
-            references=retrieval_data["references"]
+            conversation_id=conversation_id,
+            response_string=final_answer if "response_string" in fields else None,
+            messages=messages if "messages" in fields else None,
+            activity=retrieval_data["activity"] if "activity" in fields else None,
+            references=references if "references" in fields else None
         )
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error performing retrieval: {str(e)}")
 
+MAX_PROFILE_TRIGGER_COUNT = 100
+
+@app.post("/admin/profiling/trigger")
+def trigger_profiling_endpoint(count: int = Query(1, ge=1, le=MAX_PROFILE_TRIGGER_COUNT), x_admin_key: Optional[str] = Header(None)):
+    check_admin_key(x_admin_key)
+    pending = profiler.trigger(count)
+    return {"message": f"Next {pending} request(s) will be profiled", "status": "success"}
+
+@app.get("/admin/profiling/captures")
+def list_profiling_captures_endpoint(x_admin_key: Optional[str] = Header(None)):
+    check_admin_key(x_admin_key)
+    return {"captures": profiler.list_captures()}
+
+@app.get("/admin/profiling/captures/{capture_id}/{file_name}")
+def download_profiling_capture_endpoint(capture_id: str, file_name: str, x_admin_key: Optional[str] = Header(None)):
+    check_admin_key(x_admin_key)
+    path = profiler.get_capture_file(capture_id, file_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Capture file '{capture_id}/{file_name}' not found")
+    return FileResponse(path, filename=f"{capture_id}_{file_name}")
+
 @app.delete("/delete-knowledge-agent")
 def delete_knowledge_agent_endpoint():
     try:
-        global knowledge_agent, messages
-        
-        # Create fresh index client
-        index_client = SearchIndexClient(endpoint=endpoint, credential=search_credential)
+        # Shared index client
+        index_client = get_search_index_client()
         # Delete the knowledge agent
         index_client.delete_agent(agent_name)
         
-        # Reset global variables
-        knowledge_agent = None
-        messages = []
+        # Reset shared state for every worker
+        reset_knowledge_agent_state()
         
         return {"message": f"Knowledge agent '{agent_name}' deleted successfully", "status": "success"}
     except Exception as e:
@@ -323,18 +590,17 @@ def delete_knowledge_agent_endpoint():
 @app.delete("/delete-search-index")
 def delete_search_index_endpoint():
     try:
-        global knowledge_agent, messages
-        
-        # Create fresh index client
-        index_client = SearchIndexClient(endpoint=endpoint, credential=search_credential)
-        # Delete the search index
-        index_client.delete_index(index_name)
+        # Shared index client
+        index_client = get_search_index_client()
+        # Delete the search index (and every domain index when DOMAIN_INDEXES is set)
+        target_index_names = [target_index_name for target_index_name, _ in get_target_indexes(index_name, domains)]
+        for target_index_name in target_index_names:
+            index_client.delete_index(target_index_name)
         
-        # Reset global variables since index is gone
-        knowledge_agent = None
-        messages = []
+        # Reset shared state since index is gone
+        reset_knowledge_agent_state()
         
-        return {"message": f"Index '{index_name}' deleted successfully", "status": "success"}
+        return {"message": f"Index(es) {', '.join(repr(name) for name in target_index_names)} deleted successfully", "status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting search index: {str(e)}")
 
@@ -0,0 +1,89 @@
+"""
+Hedging benchmark against a fake upstream with a heavy-tailed (Pareto) latency distribution.
+
+Runs the same workload with and without hedging and reports latency percentiles,
+the extra upstream load caused by hedges and how often the deadline was hit.
+
+Usage (from the repository root):
+    python -m benchmarks.hedging
+    python -m benchmarks.hedging --calls 2000 --budget-ratio 0.1 --deadline 1.0
+"""
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from resilience import Deadline, DeadlineExceeded, Hedger, Metrics
+
+class FakeUpstream:
+    """Idempotent upstream whose latency is base * Pareto(alpha), capped at max_latency"""
+
+    def __init__(self, base_latency=0.01, alpha=1.5, max_latency=2.0, seed=None):
+        self.base_latency = base_latency
+        self.alpha = alpha
+        self.max_latency = max_latency
+        self.random = random.Random(seed)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, timeout=None):
+        with self._lock:
+            self.calls += 1
+            latency = min(self.max_latency, self.base_latency * self.random.paretovariate(self.alpha))
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("upstream call timed out")
+        time.sleep(latency)
+        return latency
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def run(label, hedger, upstream, calls, concurrency, deadline_seconds):
+    latencies = []
+    deadline_misses = 0
+    lock = threading.Lock()
+
+    def one_call(_):
+        nonlocal deadline_misses
+        start = time.perf_counter()
+        try:
+            hedger.call(upstream, deadline=Deadline(deadline_seconds))
+        except (DeadlineExceeded, TimeoutError):
+            with lock:
+                deadline_misses += 1
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one_call, range(calls)))
+
+    print(f"{label}:")
+    print(f"  p50 {percentile(latencies, 50) * 1000:7.1f} ms   p95 {percentile(latencies, 95) * 1000:7.1f} ms   p99 {percentile(latencies, 99) * 1000:7.1f} ms   max {max(latencies) * 1000:7.1f} ms")
+    print(f"  upstream calls {upstream.calls} for {calls} requests ({(upstream.calls / calls - 1) * 100:.1f}% extra load), deadline misses {deadline_misses}")
+    counters = hedger.metrics.snapshot()
+    if counters:
+        print(f"  {counters}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tail latency with and without hedging on a heavy-tailed fake upstream")
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--base-latency", type=float, default=0.01, help="minimum upstream latency in seconds")
+    parser.add_argument("--alpha", type=float, default=1.5, help="Pareto shape, lower is heavier tailed")
+    parser.add_argument("--percentile", type=float, default=95)
+    parser.add_argument("--budget-ratio", type=float, default=0.05)
+    parser.add_argument("--deadline", type=float, default=2.0, help="per-request deadline in seconds (0 = none)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    baseline = Hedger("fake_upstream", enabled=False, metrics=Metrics())
+    run("no hedging", baseline, FakeUpstream(args.base_latency, args.alpha, seed=args.seed), args.calls, args.concurrency, args.deadline)
+
+    hedged = Hedger("fake_upstream", enabled=True, percentile=args.percentile, budget_ratio=args.budget_ratio, min_delay=args.base_latency, max_workers=args.concurrency * 2, metrics=Metrics())
+    run(f"hedging at p{args.percentile:g}, budget {args.budget_ratio:g}", hedged, FakeUpstream(args.base_latency, args.alpha, seed=args.seed), args.calls, args.concurrency, args.deadline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Startup benchmark for the entry points.
+
+Measures import time of a module with `python -X importtime` and the time from
+spawning the API server until /health first answers.
+
+Usage (from the repository root):
+    python -m benchmarks.startup
+    python -m benchmarks.startup --module agentic_search --runs 5 --skip-healthcheck
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_import_time(module):
+    """Return (total_seconds, [(cumulative_us, package), ...]) for importing `module` in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, package = line[len("import time:"):].split("|")
+        imports.append((int(cumulative), package.rstrip()))
+
+    total = next((cumulative for cumulative, package in imports if package.strip() == module), 0)
+    return total / 1_000_000, imports
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_time_to_first_healthcheck(app, timeout=60.0):
+    """Spawn uvicorn serving `app` and return seconds until GET /health returns 200"""
+    port = get_free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited early:\n{server.stderr.read().decode()[-2000:]}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"/health did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def summarize(label, samples):
+    print(f"{label}: median {statistics.median(samples) * 1000:.1f} ms, min {min(samples) * 1000:.1f} ms, max {max(samples) * 1000:.1f} ms ({len(samples)} runs)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time-to-first-healthcheck")
+    parser.add_argument("--module", default="api_agentic_retrieval", help="module to import")
+    parser.add_argument("--app", default="api_agentic_retrieval:app", help="ASGI app for the healthcheck benchmark")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to list")
+    parser.add_argument("--skip-healthcheck", action="store_true")
+    args = parser.parse_args()
+
+    import_samples = []
+    imports = []
+    for _ in range(args.runs):
+        total, imports = measure_import_time(args.module)
+        import_samples.append(total)
+    summarize(f"import {args.module}", import_samples)
+
+    print("\nSlowest imports (cumulative, last run):")
+    for cumulative, package in sorted(imports, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {package}")
+
+    if not args.skip_healthcheck:
+        healthcheck_samples = [measure_time_to_first_healthcheck(args.app) for _ in range(args.runs)]
+        print()
+        summarize("time to first /health", healthcheck_samples)
+
+if __name__ == "__main__":
+    main()
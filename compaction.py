@@ -0,0 +1,89 @@
+import json
+import re
+
+RESPONSE_FIELDS = ("response_string", "messages", "activity", "references")
+
+# citations look like [ref_id:3], [3] or [claims:3] in generated answers
+CITATION_PATTERN = re.compile(r"\[(?:ref_id:\s*)?([^\[\]\s,]+)\]")
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for budgeting"""
+    return len(text) // 4 + 1
+
+def normalize_text(text):
+    return " ".join(str(text).lower().split())
+
+def get_reference_score(reference):
+    # merged domain results carry a normalized score, single-index results the raw reranker score
+    score = reference.get("normalized_score", reference.get("reranker_score", reference.get("rerankerScore")))
+    return float(score) if score is not None else 0.0
+
+def compact_retrieval_response(response_text, references, token_budget=0):
+    """
+    Deduplicate overlapping chunks and keep the top-scored ones within token_budget (0 = unlimited).
+    Returns the compacted response text and the ref_ids of the chunks that were kept.
+    """
+    try:
+        chunks = json.loads(response_text) if response_text else []
+    except ValueError:
+        return response_text, None
+    if not isinstance(chunks, list):
+        return response_text, None
+
+    score_by_ref_id = {str(r.get("id")): get_reference_score(r) for r in references}
+
+    def chunk_ref_id(i):
+        ref_id = chunks[i].get("ref_id") if isinstance(chunks[i], dict) else None
+        return str(ref_id) if ref_id is not None else None
+
+    def chunk_score(i):
+        return score_by_ref_id.get(chunk_ref_id(i), 0.0)
+
+    # drop exact duplicates and chunks whose text is contained in a longer chunk,
+    # of identical chunks the highest scored one is kept so its reference survives
+    normalized = [normalize_text(chunk.get("content", chunk) if isinstance(chunk, dict) else chunk) for chunk in chunks]
+    by_length = sorted(range(len(chunks)), key=lambda i: (len(normalized[i]), chunk_score(i)), reverse=True)
+    unique = []
+    for i in by_length:
+        if any(normalized[i] in normalized[j] for j in unique):
+            continue
+        unique.append(i)
+
+    # keep the highest scored chunks that fit in the budget, in their original order
+    kept = []
+    used_tokens = 0
+    for i in sorted(unique, key=chunk_score, reverse=True):
+        # ensure_ascii=False keeps non-ASCII text as is instead of \uXXXX escapes that cost extra tokens
+        tokens = estimate_tokens(json.dumps(chunks[i], separators=(",", ":"), ensure_ascii=False))
+        if token_budget and kept and used_tokens + tokens > token_budget:
+            continue
+        kept.append(i)
+        used_tokens += tokens
+    kept.sort()
+
+    compacted = [chunks[i] for i in kept]
+    return json.dumps(compacted, separators=(",", ":"), ensure_ascii=False), {chunk_ref_id(i) for i in kept}
+
+def select_references(references, answer, kept_ref_ids=None, max_references=0):
+    """
+    Keep only references cited in the answer, falling back to the top-scored references
+    of the chunks sent to the model. max_references caps the result (0 = unlimited).
+    """
+    candidates = references
+    if kept_ref_ids is not None:
+        candidates = [r for r in references if str(r.get("id")) in kept_ref_ids]
+
+    cited_ids = set(CITATION_PATTERN.findall(answer or ""))
+    selected = [r for r in candidates if str(r.get("id")) in cited_ids]
+    if not selected:
+        selected = sorted(candidates, key=get_reference_score, reverse=True)
+
+    if max_references:
+        selected = selected[:max_references]
+    return selected
+
+def parse_fields(value):
+    """Parse a comma separated field list (e.g. "response_string,references")"""
+    if not value:
+        return list(RESPONSE_FIELDS)
+    return [field.strip() for field in value.split(",") if field.strip()]
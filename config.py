@@ -0,0 +1,138 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+# Shared configuration and client layer for the API, the demo script and the data loader.
+# Nothing here touches the network or imports the Azure/OpenAI SDKs until a client is first requested.
+
+@dataclass(frozen=True)
+class Settings:
+    # Azure services
+    search_endpoint: Optional[str]
+    search_key: Optional[str]
+    azure_openai_endpoint: Optional[str]
+    azure_openai_api_key: Optional[str]
+    azure_openai_api_version: Optional[str]
+    azure_openai_gpt_deployment: Optional[str]
+    azure_openai_gpt_model: Optional[str]
+    azure_openai_embedding_deployment: Optional[str]
+    azure_openai_embedding_model: Optional[str]
+    index_name: Optional[str]
+    agent_name: Optional[str]
+    answer_model: Optional[str]
+    api_version: Optional[str]
+    max_conversation_history: int
+    # per-domain indexes
+    domain_indexes: Optional[str]
+    domain_reranker_thresholds: Optional[str]
+    # retrieval payload compaction and response encoding
+    retrieval_token_budget: int
+    max_references: int
+    default_response_fields: Optional[str]
+    gzip_minimum_size: int
+    # profiling and admin endpoints
+    profile_sample_rate: float
+    profile_dir: str
+    profile_max_captures: int
+    admin_api_key: Optional[str]
+    # shared state
+    state_backend_url: Optional[str]
+    conversation_ttl_seconds: float
+    provisioning_timeout_seconds: float
+    conversation_lock_timeout_seconds: float
+    # admission control and circuit breakers
+    max_concurrent_requests: int
+    max_queued_requests: int
+    queue_timeout_seconds: float
+    circuit_failure_threshold: int
+    circuit_reset_timeout_seconds: float
+    circuit_half_open_max_calls: int
+    # deadlines and hedging
+    request_deadline_seconds: float
+    hedge_retrieve: bool
+    hedge_percentile: float
+    hedge_budget_ratio: float
+    hedge_min_delay_seconds: float
+
+def _get_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+def _get_float(name, default):
+    return float(os.getenv(name, str(default)))
+
+def _get_bool(name, default=False):
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Load environment variables (once per process) and return the shared settings. Every setting is read here."""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    return Settings(
+        search_endpoint=os.getenv("AZURE_SEARCH_ENDPOINT"),
+        search_key=os.getenv("AZURE_SEARCH_KEY"),
+        azure_openai_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        azure_openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        azure_openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+        azure_openai_gpt_deployment=os.getenv("AZURE_OPENAI_GPT_DEPLOYMENT"),
+        azure_openai_gpt_model=os.getenv("AZURE_OPENAI_GPT_MODEL"),
+        azure_openai_embedding_deployment=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
+        azure_openai_embedding_model=os.getenv("AZURE_OPENAI_EMBEDDING_MODEL"),
+        index_name=os.getenv("INDEX_NAME"),
+        agent_name=os.getenv("AGENT_NAME"),
+        answer_model=os.getenv("ANSWER_MODEL"),
+        api_version=os.getenv("API_VERSION"),
+        max_conversation_history=_get_int("MAX_CONVERSATION_HISTORY", 1),
+        domain_indexes=os.getenv("DOMAIN_INDEXES"),
+        domain_reranker_thresholds=os.getenv("DOMAIN_RERANKER_THRESHOLDS"),
+        retrieval_token_budget=_get_int("RETRIEVAL_TOKEN_BUDGET", 0),
+        max_references=_get_int("MAX_REFERENCES", 0),
+        default_response_fields=os.getenv("DEFAULT_RESPONSE_FIELDS"),
+        gzip_minimum_size=_get_int("GZIP_MINIMUM_SIZE", 1000),
+        profile_sample_rate=_get_float("PROFILE_SAMPLE_RATE", 0),
+        profile_dir=os.getenv("PROFILE_DIR", "profiles"),
+        profile_max_captures=_get_int("PROFILE_MAX_CAPTURES", 20),
+        admin_api_key=os.getenv("ADMIN_API_KEY"),
+        state_backend_url=os.getenv("STATE_BACKEND_URL"),
+        conversation_ttl_seconds=_get_float("CONVERSATION_TTL_SECONDS", 86400),
+        provisioning_timeout_seconds=_get_float("PROVISIONING_TIMEOUT_SECONDS", 60),
+        conversation_lock_timeout_seconds=_get_float("CONVERSATION_LOCK_TIMEOUT_SECONDS", 60),
+        max_concurrent_requests=_get_int("MAX_CONCURRENT_REQUESTS", 16),
+        max_queued_requests=_get_int("MAX_QUEUED_REQUESTS", 32),
+        queue_timeout_seconds=_get_float("QUEUE_TIMEOUT_SECONDS", 5),
+        circuit_failure_threshold=_get_int("CIRCUIT_FAILURE_THRESHOLD", 5),
+        circuit_reset_timeout_seconds=_get_float("CIRCUIT_RESET_TIMEOUT_SECONDS", 30),
+        circuit_half_open_max_calls=_get_int("CIRCUIT_HALF_OPEN_MAX_CALLS", 1),
+        request_deadline_seconds=_get_float("REQUEST_DEADLINE_SECONDS", 60),
+        hedge_retrieve=_get_bool("HEDGE_RETRIEVE"),
+        hedge_percentile=_get_float("HEDGE_PERCENTILE", 95),
+        hedge_budget_ratio=_get_float("HEDGE_BUDGET_RATIO", 0.05),
+        hedge_min_delay_seconds=_get_float("HEDGE_MIN_DELAY_SECONDS", 0.1)
+    )
+
+@lru_cache(maxsize=None)
+def get_search_credential():
+    from azure.core.credentials import AzureKeyCredential
+    return AzureKeyCredential(get_settings().search_key)
+
+@lru_cache(maxsize=None)
+def get_search_index_client():
+    from azure.search.documents.indexes import SearchIndexClient
+    return SearchIndexClient(endpoint=get_settings().search_endpoint, credential=get_search_credential())
+
+@lru_cache(maxsize=None)
+def get_knowledge_agent_client(index_name: str, agent_name: str):
+    from azure.search.documents.agent import KnowledgeAgentRetrievalClient
+    return KnowledgeAgentRetrievalClient(endpoint=get_settings().search_endpoint, credential=get_search_credential(), index_name=index_name, agent_name=agent_name)
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    from openai import AzureOpenAI
+    settings = get_settings()
+    return AzureOpenAI(
+        azure_endpoint=settings.azure_openai_endpoint,
+        api_version=settings.azure_openai_api_version,
+        api_key=settings.azure_openai_api_key
+    )
@@ -0,0 +1,123 @@
+import json
+
+# map each CSV type to the domain index it is ingested into
+DOMAIN_BY_CSV_TYPE = {
+    "customer_data": "customers",
+    "policy_documents": "policies",
+    "coverage_details": "policies",
+    "policy_exclusions": "policies",
+    "claims_history": "claims",
+    "claim_procedures": "claims",
+    "agent_contacts": "providers",
+    "network_providers": "providers",
+}
+
+DEFAULT_RERANKER_THRESHOLD = 2.0
+MAX_RERANKER_SCORE = 4.0
+
+def parse_domains(value):
+    """Parse DOMAIN_INDEXES (e.g. "claims,policies") into a list of domain names"""
+    if not value:
+        return []
+    return [domain.strip() for domain in value.split(",") if domain.strip()]
+
+def parse_reranker_thresholds(value):
+    """Parse DOMAIN_RERANKER_THRESHOLDS (e.g. "claims=2.0,providers=1.5") into a dict"""
+    thresholds = {}
+    if not value:
+        return thresholds
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        domain, threshold = item.split("=", 1)
+        thresholds[domain.strip()] = float(threshold)
+    return thresholds
+
+def domain_index_name(base_index_name, domain):
+    return f"{base_index_name}-{domain}"
+
+def get_target_indexes(base_index_name, domains, thresholds=None, default_threshold=DEFAULT_RERANKER_THRESHOLD):
+    """
+    Return a list of (index_name, reranker_threshold) tuples to query.
+    Without domains configured, everything lives in the single base index.
+    """
+    thresholds = thresholds or {}
+    if not domains:
+        return [(base_index_name, thresholds.get(base_index_name, default_threshold))]
+    return [(domain_index_name(base_index_name, domain), thresholds.get(domain, default_threshold)) for domain in domains]
+
+def get_index_for_csv_type(base_index_name, domains, csv_type):
+    """
+    Resolve the index a CSV type is ingested into (the base index when not split by domain).
+    When split by domain, the CSV's domain must be configured: the base index is then
+    neither created nor queried, so falling back to it would lose the data.
+    """
+    if not domains:
+        return base_index_name
+    domain = DOMAIN_BY_CSV_TYPE.get(csv_type)
+    if domain not in domains:
+        raise ValueError(f"CSV type '{csv_type}' belongs to domain '{domain}', which is not in DOMAIN_INDEXES ({', '.join(domains)}); add it or skip this CSV")
+    return domain_index_name(base_index_name, domain)
+
+def get_reranker_score(reference):
+    # as_dict() uses attribute names, the wire format uses camelCase
+    score = reference.get("reranker_score", reference.get("rerankerScore"))
+    return float(score) if score is not None else 0.0
+
+def normalize_scores(references, reranker_threshold=0.0):
+    """
+    Normalize reranker scores to 0..1 relative to the index threshold so indexes tuned
+    with different thresholds are comparable (semantic reranker scores range 0..4)
+    """
+    span = max(MAX_RERANKER_SCORE - reranker_threshold, 1e-9)
+    return [min(max((get_reranker_score(r) - reranker_threshold) / span, 0.0), 1.0) for r in references]
+
+def merge_retrieval_results(results):
+    """
+    Merge per-index retrieval results into a single response.
+    results: list of (index_name, reranker_threshold, response_text, activity, references) tuples.
+    References under their index threshold are dropped, reference ids are prefixed with the
+    index name so citations stay unique, and chunks/references are ordered by normalized score.
+    """
+    merged_chunks = []
+    merged_references = []
+    merged_activity = []
+
+    for result_index_name, reranker_threshold, response_text, activity, references in results:
+        normalized = normalize_scores(references, reranker_threshold)
+        score_by_ref_id = {}
+        dropped_ref_ids = set()
+        for reference, score in zip(references, normalized):
+            ref_id = str(reference.get("id"))
+            if get_reranker_score(reference) < reranker_threshold:
+                dropped_ref_ids.add(ref_id)
+                continue
+            score_by_ref_id[ref_id] = score
+            merged_references.append(dict(reference, id=f"{result_index_name}:{ref_id}", index_name=result_index_name, normalized_score=score))
+
+        # response text is a JSON list of chunks with a ref_id that maps to a reference id
+        try:
+            chunks = json.loads(response_text) if response_text else []
+        except ValueError:
+            chunks = [{"ref_id": None, "content": response_text}]
+        if not isinstance(chunks, list):
+            chunks = [chunks]
+        for chunk in chunks:
+            ref_id = chunk.get("ref_id") if isinstance(chunk, dict) else None
+            if ref_id is not None:
+                ref_id = str(ref_id)
+                if ref_id in dropped_ref_ids:
+                    continue
+                chunk = dict(chunk, ref_id=f"{result_index_name}:{ref_id}")
+            merged_chunks.append((score_by_ref_id.get(ref_id, 0.0), chunk))
+
+        merged_activity.extend(dict(a, index_name=result_index_name) for a in activity)
+
+    merged_chunks.sort(key=lambda item: item[0], reverse=True)
+    merged_references.sort(key=lambda r: r["normalized_score"], reverse=True)
+
+    return {
+        "response": json.dumps([chunk for _, chunk in merged_chunks], separators=(",", ":"), ensure_ascii=False),
+        "activity": merged_activity,
+        "references": merged_references,
+    }
@@ -0,0 +1,169 @@
+import os
+import io
+import re
+import time
+import random
+import shutil
+import pstats
+import cProfile
+import threading
+import functools
+import contextvars
+import tracemalloc
+from contextlib import contextmanager
+
+class Profiler:
+    """
+    Opt-in profiler that captures a CPU profile and a tracemalloc allocation snapshot
+    for a sampled fraction of requests (or ingestion batches).
+    Captures are written to <profile_dir>/<timestamp>_<name>_<request_id>/ and only the
+    most recent max_captures are kept. With sample_rate 0 and no triggered captures
+    should_capture() is a single comparison, so it costs nothing when disabled.
+    cProfile only sees the thread it is enabled in, so work handed to executor threads
+    is profiled by wrapping it with bind() and merged into the request's capture.
+    """
+
+    def __init__(self, sample_rate=0.0, profile_dir="profiles", max_captures=20, top_n=50):
+        self.sample_rate = sample_rate
+        self.profile_dir = profile_dir
+        self.max_captures = max_captures
+        self.top_n = top_n
+        self._triggered = 0
+        self._lock = threading.Lock()
+        # tracemalloc is process wide, so only one capture runs at a time
+        self._capture_lock = threading.Lock()
+        # profiles of executor threads working for the capture running in this context
+        self._worker_profiles = contextvars.ContextVar("worker_profiles", default=None)
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            sample_rate=settings.profile_sample_rate,
+            profile_dir=settings.profile_dir,
+            max_captures=settings.profile_max_captures
+        )
+
+    def trigger(self, count=1):
+        """Force the next `count` requests to be captured regardless of the sample rate"""
+        if count <= 0:
+            raise ValueError(f"Profile trigger count must be positive, got {count}")
+        with self._lock:
+            self._triggered += count
+            return self._triggered
+
+    def should_capture(self):
+        if not self._triggered and self.sample_rate <= 0:
+            return False
+        with self._lock:
+            if self._triggered > 0:
+                self._triggered -= 1
+                return True
+        return random.random() < self.sample_rate
+
+    def bind(self, function):
+        """
+        Wrap a function that is about to be submitted to an executor so that, when it is
+        called from inside a capture, it is profiled in the worker thread as part of that capture
+        """
+        worker_profiles = self._worker_profiles.get()
+        if worker_profiles is None:
+            return function
+
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            # nested submits from the worker thread join the same capture
+            token = self._worker_profiles.set(worker_profiles)
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.disable()
+                worker_profiles.append(profiler)
+                self._worker_profiles.reset(token)
+        return profiled
+
+    @contextmanager
+    def capture(self, name, request_id):
+        """Profile the enclosed block when it is sampled, otherwise do nothing"""
+        if (not self._triggered and self.sample_rate <= 0) or not self._capture_lock.acquire(blocking=False):
+            yield None
+            return
+        # decide only once the capture can run, so a busy capture doesn't use up a triggered one
+        if not self.should_capture():
+            self._capture_lock.release()
+            yield None
+            return
+
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+        start_snapshot = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        worker_profiles = []
+        token = self._worker_profiles.set(worker_profiles)
+        start_time = time.perf_counter()
+        profiler.enable()
+        try:
+            yield request_id
+        finally:
+            profiler.disable()
+            self._worker_profiles.reset(token)
+            elapsed = time.perf_counter() - start_time
+            end_snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if started_tracemalloc:
+                tracemalloc.stop()
+            try:
+                self._write_capture(name, request_id, elapsed, profiler, list(worker_profiles), start_snapshot, end_snapshot, peak)
+            except OSError as e:
+                print(f"Error writing profile capture for {name} ({request_id}): {e}")
+            finally:
+                self._capture_lock.release()
+
+    def _write_capture(self, name, request_id, elapsed, profiler, worker_profiles, start_snapshot, end_snapshot, peak):
+        safe_request_id = re.sub(r"[^\w.-]", "_", str(request_id))[:64]
+        capture_id = f"{time.strftime('%Y%m%dT%H%M%S')}_{name}_{safe_request_id}"
+        capture_dir = os.path.join(self.profile_dir, capture_id)
+        os.makedirs(capture_dir, exist_ok=True)
+
+        # request thread and executor threads merged, the raw profile can be opened with pstats or snakeviz
+        stats_output = io.StringIO()
+        stats = pstats.Stats(profiler, *worker_profiles, stream=stats_output)
+        stats.dump_stats(os.path.join(capture_dir, "cpu.prof"))
+        stats.sort_stats("cumulative").print_stats(self.top_n)
+        with open(os.path.join(capture_dir, "cpu.txt"), "w", encoding="utf-8") as file:
+            file.write(f"Request: {request_id}\nElapsed: {elapsed:.3f}s\nWorker threads: {len(worker_profiles)}\n\n")
+            file.write(stats_output.getvalue())
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+        start_snapshot = start_snapshot.filter_traces(filters)
+        end_snapshot = end_snapshot.filter_traces(filters)
+        with open(os.path.join(capture_dir, "memory.txt"), "w", encoding="utf-8") as file:
+            file.write(f"Request: {request_id}\nPeak traced memory: {peak / 1024:.1f} KiB\n\n")
+            file.write(f"Top {self.top_n} allocation growth by line:\n")
+            for stat in end_snapshot.compare_to(start_snapshot, "lineno")[:self.top_n]:
+                file.write(f"{stat}\n")
+            file.write(f"\nTop {self.top_n} live allocations by line:\n")
+            for stat in end_snapshot.statistics("lineno")[:self.top_n]:
+                file.write(f"{stat}\n")
+
+        self._rotate()
+
+    def _rotate(self):
+        captures = self.list_captures()
+        for capture_id in captures[:-self.max_captures] if self.max_captures > 0 else []:
+            shutil.rmtree(os.path.join(self.profile_dir, capture_id), ignore_errors=True)
+
+    def list_captures(self):
+        """Capture ids, oldest first"""
+        if not os.path.isdir(self.profile_dir):
+            return []
+        return sorted(entry for entry in os.listdir(self.profile_dir) if os.path.isdir(os.path.join(self.profile_dir, entry)))
+
+    def get_capture_file(self, capture_id, file_name):
+        """Resolve a file inside a capture, or None if it does not exist"""
+        if capture_id not in self.list_captures() or file_name not in ("cpu.prof", "cpu.txt", "memory.txt"):
+            return None
+        path = os.path.join(self.profile_dir, capture_id, file_name)
+        return path if os.path.isfile(path) else None
@@ -0,0 +1,367 @@
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import asynccontextmanager
+
+# Admission control, circuit breaking, deadlines and hedging for the API and its upstream calls
+# (Azure AI Search knowledge agent retrieval and Azure OpenAI responses).
+
+class Metrics:
+    """Thread-safe counters exposed by the /metrics endpoint"""
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters)
+
+class Overloaded(Exception):
+    """Request was not admitted. status_code is 429 (shed) or 503 (queue wait timed out)."""
+
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class CircuitOpenError(Exception):
+    """Upstream call rejected because its circuit breaker is open"""
+
+    def __init__(self, upstream, retry_after):
+        super().__init__(f"Upstream '{upstream}' is unavailable (circuit open)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+class DeadlineExceeded(Exception):
+    """The end-to-end request deadline passed before an upstream call completed"""
+
+def retry_after_seconds(seconds):
+    return max(1, math.ceil(seconds))
+
+class Deadline:
+    """End-to-end request deadline carried through every upstream call (timeout None = no deadline)"""
+
+    def __init__(self, timeout=None):
+        self.expires_at = time.monotonic() + timeout if timeout else None
+
+    def remaining(self):
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, operation):
+        if self.expired():
+            raise DeadlineExceeded(f"Request deadline exceeded before {operation}")
+
+class AdmissionController:
+    """
+    Bounded concurrency limiter with a bounded, deadline-aware wait queue.
+    Requests over max_concurrency wait up to queue_timeout for a slot. They are shed
+    immediately (429) when the queue is full or when the expected wait, estimated from
+    the moving average service time, already exceeds queue_timeout; requests that
+    time out while queued get a 503.
+    It runs on the event loop, so queued requests wait there without holding a worker thread.
+    """
+
+    def __init__(self, max_concurrency=16, max_queue=32, queue_timeout=5.0, metrics=None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.metrics = metrics or Metrics()
+        self.active = 0
+        self.queued = 0
+        self.average_service_time = 0.0
+        # created on first use so it belongs to the server's event loop
+        self._condition = None
+
+    def _expected_wait(self):
+        # queued requests ahead of us drain max_concurrency at a time
+        return (self.queued + 1) * self.average_service_time / self.max_concurrency
+
+    @asynccontextmanager
+    async def admit(self, deadline=None):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        # never queue longer than the request has left
+        queue_timeout = self.queue_timeout
+        if deadline is not None and deadline.remaining() is not None:
+            queue_timeout = min(queue_timeout, deadline.remaining())
+
+        async with self._condition:
+            if self.active >= self.max_concurrency:
+                expected_wait = self._expected_wait()
+                if self.queued >= self.max_queue:
+                    self.metrics.increment("admission_shed_queue_full")
+                    raise Overloaded("Server is overloaded, request queue is full", 429, retry_after_seconds(expected_wait))
+                if expected_wait > queue_timeout:
+                    self.metrics.increment("admission_shed_expected_wait")
+                    raise Overloaded("Server is overloaded, expected queue wait exceeds the deadline", 429, retry_after_seconds(expected_wait))
+
+                self.queued += 1
+                try:
+                    await asyncio.wait_for(self._condition.wait_for(lambda: self.active < self.max_concurrency), queue_timeout)
+                except asyncio.TimeoutError:
+                    # a notify() that raced with the timeout was meant for a waiter, pass it on
+                    # so no queued request gets a 503 while a slot is free
+                    if self.active < self.max_concurrency:
+                        self._condition.notify()
+                    self.metrics.increment("admission_rejected_queue_timeout")
+                    raise Overloaded("Server is overloaded, timed out waiting for a request slot", 503, retry_after_seconds(self._expected_wait()))
+                finally:
+                    self.queued -= 1
+            self.active += 1
+            self.metrics.increment("admission_admitted")
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            async with self._condition:
+                self.active -= 1
+                # exponentially weighted moving average of service time
+                self.average_service_time = elapsed if not self.average_service_time else 0.8 * self.average_service_time + 0.2 * elapsed
+                self._condition.notify()
+
+    def state(self):
+        return {"active": self.active, "queued": self.queued, "max_concurrency": self.max_concurrency, "max_queue": self.max_queue, "average_service_time": round(self.average_service_time, 4)}
+
+def is_upstream_failure(error):
+    """Server errors, throttling and transport errors count against the breaker, client errors do not"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code is None or status_code >= 500 or status_code == 429
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker. After failure_threshold consecutive failures the circuit
+    opens and calls fail fast for reset_timeout seconds. Then it goes half-open and lets
+    up to half_open_max_calls probe calls through: a success closes it, a failure reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, half_open_max_calls=1, metrics=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.metrics = metrics or Metrics()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _before_call(self):
+        with self._lock:
+            if self._state == self.OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.metrics.increment(f"circuit_rejected:{self.name}")
+                    raise CircuitOpenError(self.name, retry_after_seconds(remaining))
+                self._state = self.HALF_OPEN
+                self._probes = 0
+            if self._state == self.HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self.metrics.increment(f"circuit_rejected:{self.name}")
+                    raise CircuitOpenError(self.name, 1)
+                self._probes += 1
+
+    def _on_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def _on_abandoned(self):
+        # the call neither proved nor disproved the upstream, give its probe slot back
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def _on_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.metrics.increment(f"circuit_opened:{self.name}")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def call(self, function, *args, **kwargs):
+        self._before_call()
+        try:
+            result = function(*args, **kwargs)
+        except DeadlineExceeded:
+            # our own deadline ran out, that says nothing about the upstream's health
+            self._on_abandoned()
+            raise
+        except Exception as e:
+            if is_upstream_failure(e):
+                self._on_failure()
+            else:
+                self._on_success()
+            raise
+        self._on_success()
+        return result
+
+    def state(self):
+        with self._lock:
+            return {"state": self._state, "consecutive_failures": self._failures}
+
+class LatencyTracker:
+    """Rolling window of call latencies used to pick the hedging delay"""
+
+    def __init__(self, window=1000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def percentile(self, percentile):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+class HedgeBudget:
+    """
+    Token bucket that caps hedged calls to `ratio` of primary calls: every primary call
+    earns `ratio` tokens (up to max_tokens) and every hedge spends one.
+    """
+
+    def __init__(self, ratio=0.05, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def on_primary(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_acquire(self):
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+class Hedger:
+    """
+    Runs an idempotent upstream call within the request deadline, passing the remaining time
+    as each of the call's timeout_kwargs. With a deadline the call runs in the pool and is
+    abandoned once the deadline passes, since SDK timeouts don't always bound the whole call
+    (e.g. azure-core's `timeout` doesn't cover the response read). When enabled and the call is still running after the
+    `percentile` latency of recent calls, a duplicate is sent (within the hedge budget)
+    and the first successful answer wins. Hedging starts once min_samples latencies are known.
+    Every attempt goes through `breaker` when given. An attempt that fails once the deadline
+    has passed (typically the SDK's own timeout) raises DeadlineExceeded and is not counted
+    against the breaker.
+    max_workers should cover a primary and a hedge for every concurrent call, otherwise calls
+    queue in the pool and the queueing delay itself triggers hedges.
+    bind, when given, wraps every attempt submitted to the pool (e.g. Profiler.bind).
+    """
+
+    def __init__(self, name, enabled=False, percentile=95.0, budget_ratio=0.05, min_delay=0.05, min_samples=20, window=1000, max_workers=32, breaker=None, bind=None, timeout_kwargs=("timeout",), metrics=None):
+        self.name = name
+        self.breaker = breaker
+        self.bind = bind or (lambda function: function)
+        self.timeout_kwargs = timeout_kwargs
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.latencies = LatencyTracker(window)
+        self.budget = HedgeBudget(budget_ratio)
+        self.metrics = metrics or Metrics()
+        # threads are only started when calls are submitted
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hedge-{name}")
+
+    def hedge_delay(self):
+        if len(self.latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latencies.percentile(self.percentile))
+
+    def _call_within_deadline(self, function, deadline, args, kwargs):
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            if deadline is not None and deadline.expired():
+                self.metrics.increment(f"deadline_exceeded:{self.name}")
+                raise DeadlineExceeded(f"Request deadline exceeded calling {self.name}") from e
+            raise
+
+    def _attempt(self, function, deadline, args, kwargs):
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None:
+            kwargs = dict(kwargs, **{name: remaining for name in self.timeout_kwargs})
+        start = time.monotonic()
+        if self.breaker is not None:
+            result = self.breaker.call(self._call_within_deadline, function, deadline, args, kwargs)
+        else:
+            result = self._call_within_deadline(function, deadline, args, kwargs)
+        self.latencies.record(time.monotonic() - start)
+        return result
+
+    def call(self, function, *args, deadline=None, **kwargs):
+        if deadline is not None:
+            deadline.check(self.name)
+        if not self.enabled and (deadline is None or deadline.remaining() is None):
+            # nothing to hedge and no deadline to enforce, run in the caller's thread
+            return self._attempt(function, deadline, args, kwargs)
+
+        if self.enabled:
+            self.budget.on_primary()
+        primary = self._executor.submit(self.bind(self._attempt), function, deadline, args, kwargs)
+        futures = {primary}
+
+        delay = self.hedge_delay() if self.enabled else None
+        if delay is not None:
+            remaining = deadline.remaining() if deadline is not None else None
+            done, _ = wait(futures, timeout=delay if remaining is None else min(delay, remaining))
+            if not done and not (deadline is not None and deadline.expired()):
+                if self.budget.try_acquire():
+                    self.metrics.increment(f"hedge_sent:{self.name}")
+                    futures.add(self._executor.submit(self.bind(self._attempt), function, deadline, args, kwargs))
+                else:
+                    self.metrics.increment(f"hedge_denied_budget:{self.name}")
+
+        error = None
+        pending = futures
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining() if deadline is not None else None, return_when=FIRST_COMPLETED)
+            if not done:
+                for future in pending:
+                    future.cancel()
+                self.metrics.increment(f"deadline_exceeded:{self.name}")
+                raise DeadlineExceeded(f"Request deadline exceeded waiting for {self.name}")
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self.metrics.increment(f"hedge_won:{self.name}")
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+        raise error
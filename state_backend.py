@@ -0,0 +1,253 @@
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+# Shared state (conversations, caches, provisioning flags) lives behind a small key/value
+# interface so several uvicorn workers or pods can share it. Values are grouped by namespace.
+
+# values larger than this are zlib compressed before they are stored
+COMPRESS_MIN_SIZE = 1024
+
+# how often (seconds) writes also purge expired entries from backends without native expiry
+PURGE_INTERVAL = 60
+
+try:
+    import orjson
+
+    def _dumps(value):
+        return orjson.dumps(value)
+except ImportError:
+    def _dumps(value):
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def serialize(value: Any) -> bytes:
+    """Compact JSON encoding, zlib compressed when large. The first byte marks the format."""
+    data = _dumps(value)
+    if len(data) >= COMPRESS_MIN_SIZE:
+        return b"z" + zlib.compress(data)
+    return b"j" + data
+
+def deserialize(data: bytes) -> Any:
+    if data[:1] == b"z":
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data[1:])
+
+class StateBackend(ABC):
+    """Key/value store for state shared between workers. ttl is in seconds (None = no expiry)."""
+
+    @abstractmethod
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_if_absent(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Atomically set the value only if the key does not exist. Returns True when it was set."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_if_equal(self, namespace: str, key: str, value: Any) -> bool:
+        """Atomically delete the key only if it holds value. Returns True when it was deleted."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self, namespace: str) -> None:
+        """Delete every key in a namespace"""
+        raise NotImplementedError
+
+class InMemoryStateBackend(StateBackend):
+    """Process local state, only suitable for a single worker"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def _purge_expired(self):
+        # expired entries are otherwise only dropped when their key is read again
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + PURGE_INTERVAL
+        for data_key in [k for k, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]:
+            del self._data[data_key]
+
+    def _get_entry(self, namespace, key):
+        entry = self._data.get((namespace, key))
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[(namespace, key)]
+            return None
+        return entry
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            entry = self._get_entry(namespace, key)
+        # stored serialized so callers never share mutable objects with the store
+        return deserialize(entry[0]) if entry is not None else default
+
+    def set(self, namespace, key, value, ttl=None):
+        with self._lock:
+            self._purge_expired()
+            self._data[(namespace, key)] = (serialize(value), time.time() + ttl if ttl else None)
+
+    def set_if_absent(self, namespace, key, value, ttl=None):
+        with self._lock:
+            self._purge_expired()
+            if self._get_entry(namespace, key) is not None:
+                return False
+            self._data[(namespace, key)] = (serialize(value), time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def delete_if_equal(self, namespace, key, value):
+        with self._lock:
+            entry = self._get_entry(namespace, key)
+            if entry is None or entry[0] != serialize(value):
+                return False
+            del self._data[(namespace, key)]
+            return True
+
+    def clear(self, namespace):
+        with self._lock:
+            for data_key in [k for k in self._data if k[0] == namespace]:
+                del self._data[data_key]
+
+class SQLiteStateBackend(StateBackend):
+    """State shared by every worker on a host (or pods sharing a volume) through a SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._next_purge = 0.0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS state (namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL, PRIMARY KEY (namespace, key))"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS state_expires_at ON state (expires_at)")
+
+    def _connection(self):
+        # sqlite connections can't be shared between threads, so keep one per thread
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _purge_expired(self):
+        # expired rows are filtered out on read but would otherwise stay in the file forever,
+        # every worker purges at most once per PURGE_INTERVAL
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + PURGE_INTERVAL
+        self._connection().execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+
+    def get(self, namespace, key, default=None):
+        row = self._connection().execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time())
+        ).fetchone()
+        return deserialize(row[0]) if row is not None else default
+
+    def set(self, namespace, key, value, ttl=None):
+        self._purge_expired()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, serialize(value), time.time() + ttl if ttl else None)
+        )
+
+    def set_if_absent(self, namespace, key, value, ttl=None):
+        self._purge_expired()
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM state WHERE namespace = ? AND key = ? AND expires_at <= ?", (namespace, key, now))
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, serialize(value), now + ttl if ttl else None)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def delete(self, namespace, key):
+        self._connection().execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def delete_if_equal(self, namespace, key, value):
+        cursor = self._connection().execute(
+            "DELETE FROM state WHERE namespace = ? AND key = ? AND value = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, serialize(value), time.time())
+        )
+        return cursor.rowcount == 1
+
+    def clear(self, namespace):
+        self._connection().execute("DELETE FROM state WHERE namespace = ?", (namespace,))
+
+class RedisStateBackend(StateBackend):
+    """State shared across hosts through any Redis-protocol server (Redis, Valkey, a local stand-in)"""
+
+    # compare-and-delete in one round trip, GET and DEL from the client could race with expiry
+    DELETE_IF_EQUAL_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    def __init__(self, url: str, prefix: str = "agentic-search:"):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The redis package is required for redis:// state backends, install it with 'pip install redis'")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}{namespace}:{key}"
+
+    def get(self, namespace, key, default=None):
+        data = self.client.get(self._key(namespace, key))
+        return deserialize(data) if data is not None else default
+
+    def set(self, namespace, key, value, ttl=None):
+        self.client.set(self._key(namespace, key), serialize(value), px=int(ttl * 1000) if ttl else None)
+
+    def set_if_absent(self, namespace, key, value, ttl=None):
+        return bool(self.client.set(self._key(namespace, key), serialize(value), nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, namespace, key):
+        self.client.delete(self._key(namespace, key))
+
+    def delete_if_equal(self, namespace, key, value):
+        return bool(self.client.eval(self.DELETE_IF_EQUAL_SCRIPT, 1, self._key(namespace, key), serialize(value)))
+
+    def clear(self, namespace):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}{namespace}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+def create_state_backend(url: Optional[str]) -> StateBackend:
+    """
+    Create a state backend from a URL:
+    memory:// (default), sqlite:///path/to/state.db, redis://host:6379/0 (or rediss://)
+    """
+    if not url or url.startswith("memory://"):
+        return InMemoryStateBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteStateBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateBackend(url)
+    raise ValueError(f"Unsupported STATE_BACKEND_URL: {url}")
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from resilience import AdmissionController, Overloaded, Deadline
+
+def run_requests(controller, durations):
+    """Run concurrent requests holding a slot for the given durations, return "ok" or the status code of each"""
+    async def request(duration):
+        try:
+            async with controller.admit():
+                await asyncio.sleep(duration)
+            return "ok"
+        except Overloaded as e:
+            assert e.retry_after >= 1
+            return e.status_code
+
+    async def main():
+        return await asyncio.gather(*(request(duration) for duration in durations))
+
+    return asyncio.run(main())
+
+def test_requests_within_limits_are_all_admitted():
+    controller = AdmissionController(max_concurrency=2, max_queue=4, queue_timeout=1.0)
+    assert run_requests(controller, [0.02] * 6) == ["ok"] * 6
+    assert controller.metrics.snapshot()["admission_admitted"] == 6
+    assert controller.state()["active"] == 0 and controller.state()["queued"] == 0
+
+def test_full_queue_is_shed_with_429():
+    controller = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=1.0)
+    results = run_requests(controller, [0.05] * 4)
+    assert sorted(results, key=str) == [429, 429, "ok", "ok"]
+    assert controller.metrics.snapshot()["admission_shed_queue_full"] == 2
+
+def test_expected_wait_over_queue_timeout_is_shed_with_429():
+    controller = AdmissionController(max_concurrency=1, max_queue=10, queue_timeout=0.1)
+    controller.average_service_time = 1.0
+    results = run_requests(controller, [0.05, 0.05])
+    assert sorted(results, key=str) == [429, "ok"]
+    assert controller.metrics.snapshot()["admission_shed_expected_wait"] == 1
+
+def test_queue_wait_timeout_is_rejected_with_503():
+    controller = AdmissionController(max_concurrency=1, max_queue=10, queue_timeout=0.05)
+    results = run_requests(controller, [0.3, 0.01])
+    assert results == ["ok", 503]
+    assert controller.metrics.snapshot()["admission_rejected_queue_timeout"] == 1
+
+def test_queue_wait_is_capped_by_the_deadline():
+    controller = AdmissionController(max_concurrency=1, max_queue=10, queue_timeout=10.0)
+
+    async def main():
+        async def holder():
+            async with controller.admit():
+                await asyncio.sleep(0.3)
+
+        task = asyncio.ensure_future(holder())
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as error:
+            async with controller.admit(Deadline(0.05)):
+                pass
+        await task
+        return error.value.status_code
+
+    assert asyncio.run(main()) == 503
+
+def test_freed_slots_go_to_queued_requests():
+    controller = AdmissionController(max_concurrency=1, max_queue=10, queue_timeout=0.5)
+    assert run_requests(controller, [0.1] + [0.01] * 5) == ["ok"] * 6
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded
+
+class UpstreamError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"upstream returned {status_code}")
+        self.status_code = status_code
+
+def fail(status_code=500):
+    raise UpstreamError(status_code)
+
+def succeed():
+    return "ok"
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(UpstreamError):
+            breaker.call(fail)
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("upstream", failure_threshold=3, reset_timeout=10)
+    with pytest.raises(UpstreamError):
+        breaker.call(fail)
+    assert breaker.call(succeed) == "ok"
+    trip(breaker)
+    assert breaker.state()["state"] == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.call(succeed)
+    assert error.value.retry_after >= 1
+    assert breaker.metrics.snapshot()["circuit_opened:upstream"] == 1
+
+def test_client_errors_do_not_count():
+    breaker = CircuitBreaker("upstream", failure_threshold=1)
+    with pytest.raises(UpstreamError):
+        breaker.call(fail, 400)
+    assert breaker.state()["state"] == CircuitBreaker.CLOSED
+    with pytest.raises(UpstreamError):
+        breaker.call(fail, 429)
+    assert breaker.state()["state"] == CircuitBreaker.OPEN
+
+def test_half_open_probe_success_closes():
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.call(succeed) == "ok"
+    assert breaker.state() == {"state": CircuitBreaker.CLOSED, "consecutive_failures": 0}
+
+def test_half_open_probe_failure_reopens():
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    with pytest.raises(UpstreamError):
+        breaker.call(fail)
+    assert breaker.state()["state"] == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(succeed)
+
+def test_half_open_limits_concurrent_probes():
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_timeout=0.05, half_open_max_calls=1)
+    trip(breaker)
+    time.sleep(0.06)
+
+    def probe_while_another_is_in_flight():
+        with pytest.raises(CircuitOpenError):
+            breaker.call(succeed)
+        return "ok"
+
+    assert breaker.call(probe_while_another_is_in_flight) == "ok"
+    assert breaker.state()["state"] == CircuitBreaker.CLOSED
+
+def test_deadline_exceeded_neither_counts_nor_leaks_a_probe():
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_timeout=0.05)
+
+    def deadline_exceeded():
+        raise DeadlineExceeded("deadline")
+
+    with pytest.raises(DeadlineExceeded):
+        breaker.call(deadline_exceeded)
+    assert breaker.state()["state"] == CircuitBreaker.CLOSED
+
+    trip(breaker)
+    time.sleep(0.06)
+    with pytest.raises(DeadlineExceeded):
+        breaker.call(deadline_exceeded)
+    # the abandoned probe gave its slot back, so the next probe can still close the circuit
+    assert breaker.call(succeed) == "ok"
+    assert breaker.state()["state"] == CircuitBreaker.CLOSED
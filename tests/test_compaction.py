@@ -0,0 +1,43 @@
+import json
+
+from compaction import compact_retrieval_response, select_references, parse_fields, RESPONSE_FIELDS
+
+def references(**scores):
+    return [{"id": ref_id, "reranker_score": score} for ref_id, score in scores.items()]
+
+def test_duplicates_and_contained_chunks_are_dropped():
+    chunks = [{"ref_id": "a", "content": "Policy covers fire"}, {"ref_id": "b", "content": "Policy covers fire and flood damage"}, {"ref_id": "c", "content": "policy  COVERS fire"}]
+    response, kept = compact_retrieval_response(json.dumps(chunks), references(a=3.0, b=2.0, c=1.0))
+    assert kept == {"b"}
+    assert json.loads(response) == [chunks[1]]
+
+def test_identical_chunks_keep_the_higher_scored_one():
+    chunks = [{"ref_id": "low", "content": "Deductible is 500"}, {"ref_id": "high", "content": "Deductible is 500"}]
+    response, kept = compact_retrieval_response(json.dumps(chunks), references(low=1.0, high=3.0))
+    assert kept == {"high"}
+
+    # select_references then keeps the higher-scored reference
+    selected = select_references(references(low=1.0, high=3.0), "no citations", kept)
+    assert [reference["id"] for reference in selected] == ["high"]
+
+def test_token_budget_keeps_top_scored_chunks_in_original_order():
+    chunks = [{"ref_id": ref_id, "content": f"{ref_id} " + "x" * 200} for ref_id in ("a", "b", "c")]
+    response, kept = compact_retrieval_response(json.dumps(chunks), references(a=1.0, b=3.0, c=2.0), token_budget=130)
+    assert kept == {"b", "c"}
+    assert [chunk["ref_id"] for chunk in json.loads(response)] == ["b", "c"]
+
+def test_non_ascii_text_is_not_escaped():
+    response, _ = compact_retrieval_response(json.dumps([{"ref_id": "a", "content": "Münch"}]), references(a=1.0))
+    assert "Münch" in response and "\\u" not in response
+
+def test_non_json_response_is_passed_through():
+    assert compact_retrieval_response("plain text", []) == ("plain text", None)
+
+def test_select_references_prefers_cited_ones_and_caps():
+    refs = references(a=1.0, b=3.0, c=2.0)
+    assert [r["id"] for r in select_references(refs, "See [ref_id:a] and [c]")] == ["a", "c"]
+    assert [r["id"] for r in select_references(refs, "no citations", max_references=2)] == ["b", "c"]
+
+def test_parse_fields():
+    assert parse_fields(None) == list(RESPONSE_FIELDS)
+    assert parse_fields("response_string, references") == ["response_string", "references"]
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from domain_indexes import parse_domains, parse_reranker_thresholds, get_target_indexes, get_index_for_csv_type, merge_retrieval_results
+
+def test_parse_settings():
+    assert parse_domains(None) == []
+    assert parse_domains(" claims, policies ,") == ["claims", "policies"]
+    assert parse_reranker_thresholds("claims=2.5, providers=1.5,bad") == {"claims": 2.5, "providers": 1.5}
+
+def test_target_indexes():
+    assert get_target_indexes("insurance", []) == [("insurance", 2.0)]
+    assert get_target_indexes("insurance", ["claims", "policies"], {"claims": 2.5}) == [("insurance-claims", 2.5), ("insurance-policies", 2.0)]
+
+def test_index_for_csv_type():
+    assert get_index_for_csv_type("insurance", [], "claims_history") == "insurance"
+    assert get_index_for_csv_type("insurance", ["claims"], "claims_history") == "insurance-claims"
+    with pytest.raises(ValueError):
+        get_index_for_csv_type("insurance", ["claims"], "customer_data")
+
+def result(index_name, threshold, chunks, scores):
+    references = [{"id": ref_id, "reranker_score": score} for ref_id, score in scores.items()]
+    return (index_name, threshold, json.dumps(chunks), [{"type": "search"}], references)
+
+def test_merge_orders_by_normalized_score_and_drops_below_threshold():
+    merged = merge_retrieval_results([
+        result("insurance-claims", 2.0, [{"ref_id": 0, "content": "claim"}, {"ref_id": 1, "content": "weak claim"}], {0: 3.0, 1: 1.5}),
+        result("insurance-providers", 1.0, [{"ref_id": 0, "content": "provider"}], {0: 3.7}),
+    ])
+
+    chunks = json.loads(merged["response"])
+    assert [chunk["ref_id"] for chunk in chunks] == ["insurance-providers:0", "insurance-claims:0"]
+    assert [reference["id"] for reference in merged["references"]] == ["insurance-providers:0", "insurance-claims:0"]
+    # 3.7 on a 1.0 threshold and 3.0 on a 2.0 threshold, both relative to the 4.0 maximum
+    assert merged["references"][0]["normalized_score"] == pytest.approx(0.9)
+    assert merged["references"][1]["normalized_score"] == pytest.approx(0.5)
+    assert [activity["index_name"] for activity in merged["activity"]] == ["insurance-claims", "insurance-providers"]
+
+def test_merge_keeps_non_ascii_text_unescaped():
+    merged = merge_retrieval_results([result("insurance-customers", 0.0, [{"ref_id": 0, "content": "Münch"}], {0: 3.0})])
+    assert "Münch" in merged["response"]
@@ -0,0 +1,111 @@
+import time
+import threading
+
+import pytest
+
+from resilience import Hedger, HedgeBudget, Deadline, DeadlineExceeded, CircuitBreaker
+
+class Upstream:
+    """Fake upstream returning after the next of `latencies` (the last one repeats)"""
+
+    def __init__(self, *latencies):
+        self.latencies = list(latencies)
+        self.calls = 0
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, timeout=None):
+        with self._lock:
+            latency = self.latencies[min(self.calls, len(self.latencies) - 1)]
+            self.calls += 1
+            self.timeouts.append(timeout)
+        time.sleep(latency)
+        return latency
+
+def warm_up(hedger, latency=0.001):
+    for _ in range(hedger.min_samples):
+        hedger.latencies.record(latency)
+
+def test_deadline_check_and_remaining():
+    assert Deadline(None).remaining() is None
+    assert not Deadline(0).expired()
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    assert deadline.expired() and deadline.remaining() == 0.0
+    with pytest.raises(DeadlineExceeded):
+        deadline.check("retrieve")
+
+def test_budget_caps_hedges_to_ratio_of_primaries():
+    budget = HedgeBudget(ratio=0.25, max_tokens=10)
+    hedges = 0
+    for _ in range(100):
+        budget.on_primary()
+        hedges += budget.try_acquire()
+    assert hedges == 25
+
+def test_remaining_time_is_passed_as_timeout():
+    upstream = Upstream(0)
+    hedger = Hedger("upstream", timeout_kwargs=("timeout",))
+    hedger.call(upstream, deadline=Deadline(5))
+    assert 0 < upstream.timeouts[0] <= 5
+
+def test_slow_primary_is_hedged_and_the_hedge_wins():
+    upstream = Upstream(0.5, 0.001)
+    hedger = Hedger("upstream", enabled=True, budget_ratio=1.0, min_delay=0.01)
+    warm_up(hedger)
+    start = time.monotonic()
+    hedger.call(upstream)
+    assert time.monotonic() - start < 0.3
+    assert upstream.calls == 2
+    counters = hedger.metrics.snapshot()
+    assert counters["hedge_sent:upstream"] == 1 and counters["hedge_won:upstream"] == 1
+
+def test_hedges_are_denied_without_budget():
+    upstream = Upstream(0.05)
+    hedger = Hedger("upstream", enabled=True, budget_ratio=0.0, min_delay=0.01)
+    warm_up(hedger)
+    hedger.call(upstream)
+    assert upstream.calls == 1
+    assert hedger.metrics.snapshot()["hedge_denied_budget:upstream"] == 1
+
+def test_no_hedging_before_enough_samples():
+    upstream = Upstream(0.05)
+    hedger = Hedger("upstream", enabled=True, budget_ratio=1.0, min_delay=0.01)
+    hedger.budget._tokens = 10
+    hedger.call(upstream)
+    assert upstream.calls == 1
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_call_is_abandoned_when_the_deadline_passes(enabled):
+    # the upstream ignores its timeout, like a slow response read the SDK doesn't bound
+    upstream = Upstream(1.0)
+    hedger = Hedger("upstream", enabled=enabled)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        hedger.call(upstream, deadline=Deadline(0.05))
+    assert time.monotonic() - start < 0.5
+
+def test_sdk_timeout_after_the_deadline_is_a_deadline_error_and_does_not_trip_the_breaker():
+    breaker = CircuitBreaker("upstream", failure_threshold=1)
+    hedger = Hedger("upstream", breaker=breaker)
+
+    def times_out(timeout=None):
+        time.sleep(timeout)
+        raise TimeoutError("read timed out")
+
+    deadline = Deadline(0.05)
+    with pytest.raises(DeadlineExceeded) as error:
+        hedger._attempt(times_out, deadline, (), {})
+    assert isinstance(error.value.__cause__, TimeoutError)
+    assert breaker.state()["state"] == CircuitBreaker.CLOSED
+
+def test_upstream_errors_within_the_deadline_propagate_and_count():
+    breaker = CircuitBreaker("upstream", failure_threshold=1)
+    hedger = Hedger("upstream", breaker=breaker)
+
+    def fails(timeout=None):
+        raise RuntimeError("server error")
+
+    with pytest.raises(RuntimeError):
+        hedger.call(fails, deadline=Deadline(5))
+    assert breaker.state()["state"] == CircuitBreaker.OPEN
@@ -0,0 +1,90 @@
+import time
+import threading
+
+import pytest
+
+import state_backend
+from state_backend import InMemoryStateBackend, SQLiteStateBackend, create_state_backend, serialize, deserialize
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryStateBackend()
+    return SQLiteStateBackend(str(tmp_path / "state.db"))
+
+def test_serialize_round_trip_compresses_large_values():
+    small = {"text": "Münch"}
+    large = [{"content": "x" * 100}] * 50
+    assert serialize(small)[:1] == b"j"
+    assert serialize(large)[:1] == b"z"
+    assert deserialize(serialize(small)) == small
+    assert deserialize(serialize(large)) == large
+
+def test_get_set_delete_and_clear(backend):
+    backend.set("conversations", "a", [{"role": "user", "content": "hi"}])
+    backend.set("conversations", "b", [])
+    backend.set("flags", "a", True)
+    assert backend.get("conversations", "a") == [{"role": "user", "content": "hi"}]
+    assert backend.get("conversations", "missing", "default") == "default"
+
+    backend.delete("conversations", "a")
+    assert backend.get("conversations", "a") is None
+
+    backend.clear("conversations")
+    assert backend.get("conversations", "b") is None
+    assert backend.get("flags", "a") is True
+
+def test_values_expire_after_ttl(backend):
+    backend.set("conversations", "a", 1, ttl=0.05)
+    assert backend.get("conversations", "a") == 1
+    time.sleep(0.1)
+    assert backend.get("conversations", "a") is None
+
+def test_set_if_absent_only_one_caller_wins(backend):
+    winners = []
+    barrier = threading.Barrier(8)
+
+    def contend(worker):
+        barrier.wait()
+        if backend.set_if_absent("locks", "conversation", worker, ttl=10):
+            winners.append(worker)
+
+    threads = [threading.Thread(target=contend, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(winners) == 1
+    assert backend.get("locks", "conversation") == winners[0]
+
+def test_lock_is_taken_over_after_ttl(backend):
+    assert backend.set_if_absent("locks", "conversation", "crashed-worker", ttl=0.05)
+    assert not backend.set_if_absent("locks", "conversation", "other-worker", ttl=10)
+    time.sleep(0.1)
+    assert backend.set_if_absent("locks", "conversation", "other-worker", ttl=10)
+
+    # the crashed worker's late release must not delete the new owner's lock
+    assert not backend.delete_if_equal("locks", "conversation", "crashed-worker")
+    assert backend.get("locks", "conversation") == "other-worker"
+    assert backend.delete_if_equal("locks", "conversation", "other-worker")
+    assert backend.get("locks", "conversation") is None
+
+def test_expired_entries_are_purged_on_write(backend, monkeypatch):
+    monkeypatch.setattr(state_backend, "PURGE_INTERVAL", 0)
+    backend.set("conversations", "old", 1, ttl=0.05)
+    time.sleep(0.1)
+    backend.set("conversations", "new", 2)
+
+    if isinstance(backend, SQLiteStateBackend):
+        keys = [row[0] for row in backend._connection().execute("SELECT key FROM state")]
+    else:
+        keys = [key for _, key in backend._data]
+    assert keys == ["new"]
+
+def test_create_state_backend(tmp_path):
+    assert isinstance(create_state_backend(None), InMemoryStateBackend)
+    assert isinstance(create_state_backend("memory://"), InMemoryStateBackend)
+    assert isinstance(create_state_backend(f"sqlite:///{tmp_path / 'state.db'}"), SQLiteStateBackend)
+    with pytest.raises(ValueError):
+        create_state_backend("postgres://localhost/state")
@@ -1,43 +1,24 @@
 # write import statements
-import os
 import csv
 import json
-from dotenv import load_dotenv
-from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents import SearchClient, SearchIndexingBufferedSender
-from azure.core.credentials import AzureKeyCredential
-from openai import AzureOpenAI
+import uuid
+from config import get_settings, get_search_credential, get_openai_client
+from domain_indexes import parse_domains, get_index_for_csv_type, domain_index_name
+from profiling import Profiler
 
-# Load environment variables
-load_dotenv()
+# Load environment variables (shared, lazily initialized configuration)
+settings = get_settings()
 
-# initialise the search client
-endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
-search_key = os.getenv("AZURE_SEARCH_KEY")
-search_credential = AzureKeyCredential(search_key)
+# search service endpoint, clients are created on first use
+endpoint = settings.search_endpoint
 
 # Use the index name from environment variables
-index_name = os.getenv("INDEX_NAME")
-
-# init azure open ai client configuration
-azure_openai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-azure_openai_api_key = os.getenv("AZURE_OPENAI_API_KEY")
-azure_openai_api_version = os.getenv("AZURE_OPENAI_API_VERSION")
-azure_openai_embedding_deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
-
-# Initialize Azure OpenAI client
-openai_client = AzureOpenAI(
-    azure_endpoint=azure_openai_endpoint,
-    api_key=azure_openai_api_key,
-    api_version=azure_openai_api_version
-)
-
-# Initialize search client
-search_client = SearchClient(
-    endpoint=endpoint,
-    index_name=index_name,
-    credential=search_credential
-)
+index_name = settings.index_name
+# optional per-domain indexes (e.g. "claims,policies,customers,providers")
+domains = parse_domains(settings.domain_indexes)
+
+# opt-in profiling of sampled ingestion batches
+profiler = Profiler.from_settings(settings)
 
 # read all new CSV files (excluding already ingested customer_data.csv and policy_documents.csv)
 def read_csv_file(file_path):
@@ -79,7 +60,7 @@ def read_policy_documents():
 def get_embeddings(text):
     """Generate embeddings using text-embedding-3-large model"""
     try:
-        response = openai_client.embeddings.create(
+        response = get_openai_client().embeddings.create(
             input=text,
             model="text-embedding-3-large"
         )
@@ -152,16 +133,19 @@ def prepare_documents_for_csv(csv_data, csv_type, start_row_number=1):
     return documents, row_number
 
 def upload_documents_to_index(documents, csv_type):
-    """Upload documents to the Azure AI Search index"""
+    """Upload documents to the Azure AI Search index (the domain index when DOMAIN_INDEXES is set)"""
+    from azure.search.documents import SearchIndexingBufferedSender
+
+    target_index_name = get_index_for_csv_type(index_name, domains, csv_type)
     try:
         with SearchIndexingBufferedSender(
             endpoint=endpoint,
-            index_name=index_name,
-            credential=search_credential
+            index_name=target_index_name,
+            credential=get_search_credential()
         ) as batch_client:
             batch_client.upload_documents(documents=documents)
         
-        print(f"Successfully uploaded {len(documents)} documents from {csv_type} to index '{index_name}'")
+        print(f"Successfully uploaded {len(documents)} documents from {csv_type} to index '{target_index_name}'")
         return True
     except Exception as e:
         print(f"Error uploading documents from {csv_type}: {e}")
@@ -172,6 +156,9 @@ def process_single_csv(csv_type, csv_data, row_number):
     print(f"\n--- Processing {csv_type.upper()} ---")
     print(f"Records to process: {len(csv_data)}")
     
+    # Fail before generating embeddings if this CSV's domain index is not configured
+    get_index_for_csv_type(index_name, domains, csv_type)
+    
     # Prepare documents for this CSV
     documents, next_row_number = prepare_documents_for_csv(csv_data, csv_type, row_number)
     print(f"Prepared {len(documents)} documents for indexing")
@@ -225,8 +212,9 @@ def main():
             csv_data = read_function()
             print(f"Loaded {len(csv_data)} records from {csv_type}.csv")
             
-            # Process and upload this CSV
-            current_row_number = process_single_csv(csv_type, csv_data, current_row_number)
+            # Process and upload this CSV (profiled when this batch is sampled)
+            with profiler.capture(f"ingest-{csv_type}", uuid.uuid4().hex):
+                current_row_number = process_single_csv(csv_type, csv_data, current_row_number)
             total_success += 1
             
             print(f"Completed {csv_type} - Moving to next CSV file...")
@@ -248,7 +236,10 @@ def main():
     else:
         print(f"⚠️  {total_files - total_success} CSV files failed to ingest.")
     
-    print(f"\nAll documents uploaded to index: '{index_name}'")
+    if domains:
+        print(f"\nAll documents uploaded to domain indexes: {', '.join(repr(domain_index_name(index_name, domain)) for domain in domains)}")
+    else:
+        print(f"\nAll documents uploaded to index: '{index_name}'")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file